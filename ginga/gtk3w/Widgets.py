@@ -6,12 +6,19 @@
 #
 
 import os.path
+import bisect
+import functools
+import math
+import numbers
+import sys
+import time
+import weakref
 
 from ginga.gtk3w import GtkHelp
 import ginga.icons
 
 from ginga.misc import Callback, Bunch, Settings, LineHistory
-from functools import reduce
+from ginga.fonts import font_asst
 
 from gi.repository import Gtk
 from gi.repository import Gdk
@@ -24,15 +31,13 @@ has_webkit = False
 try:
     # this is necessary to prevent a warning message on import
     gi.require_version('WebKit2', '4.0')
-
-    from gi.repository import WebKit2 as WebKit  # noqa
     has_webkit = True
 except Exception:
-    try:
-        gi.require_version('WebKit', '3.0')
-        from gi.repository import WebKit  # noqa
-    except Exception:
-        pass
+    pass
+
+# WebKit is a large library, so it is not imported until the first
+# WebView is created (see _get_webkit())
+WebKit = None
 
 __all__ = ['WidgetError', 'WidgetBase', 'TextEntry', 'TextEntrySet',
            'TextArea', 'Label', 'Button', 'ComboBox',
@@ -49,6 +54,19 @@ __all__ = ['WidgetError', 'WidgetBase', 'TextEntry', 'TextEntrySet',
 # path to our icons
 icondir = os.path.split(ginga.icons.__file__)[0]
 
+# Gdk constants used in event callbacks, looked up once
+_KEY_UP = Gdk.KEY_Up
+_KEY_DOWN = Gdk.KEY_Down
+_BUTTON_PRESS = Gdk.EventType.BUTTON_PRESS
+_BUTTON_RELEASE = Gdk.EventType.BUTTON_RELEASE
+_WS_MAXIMIZED = Gdk.WindowState.MAXIMIZED
+_WS_FULL_OR_MAX = Gdk.WindowState.FULLSCREEN | Gdk.WindowState.MAXIMIZED
+
+# Gtk.Table attach options for fixed size and stretched GridBox cells
+_ATTACH_FIXED = Gtk.AttachOptions.FILL | Gtk.AttachOptions.SHRINK
+_ATTACH_STRETCH = (Gtk.AttachOptions.EXPAND | Gtk.AttachOptions.SHRINK |
+                   Gtk.AttachOptions.FILL)
+
 
 class WidgetError(Exception):
     """For errors thrown in this module."""
@@ -58,6 +76,37 @@ class WidgetError(Exception):
 # (see TabWidget)
 _widget_move_event = None
 _app = None
+# (width, height, resolution) of the screen (see Application)
+_screen_info = None
+
+
+# emptied list stores of destroyed ComboBoxes, for reuse (see ComboBox)
+_liststore_pool = []
+_liststore_pool_max = 32
+
+# separators rescued from destroyed Menus, for reuse (see Menu)
+_separator_pool = []
+_separator_pool_max = 32
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_color(spec):
+    # parsing colors is expensive relative to how often the same handful
+    # of color names are set on widgets
+    return Gdk.color_parse(spec)
+
+
+def _popup_menu(menu_w, button=0, activate_time=0):
+    # GTK3 only: no parent menu shell/item or positioning function
+    if menu_w.get_sensitive():
+        menu_w.popup(None, None, None, None, button, activate_time)
+
+
+@functools.lru_cache(maxsize=128)
+def _get_font(font_family, resolved_family, point_size):
+    # NOTE: resolved_family is only part of the cache key, so that an
+    # alias added (or changed) after first use gets a new font
+    return GtkHelp.get_font(font_family, point_size)
 
 
 # BASE
@@ -65,7 +114,7 @@ _app = None
 class WidgetBase(Callback.Callbacks):
 
     def __init__(self):
-        super(WidgetBase, self).__init__()
+        super().__init__()
 
         self.widget = None
         # external data can be attached here
@@ -133,7 +182,9 @@ class WidgetBase(Callback.Callbacks):
             GObject.idle_add(self.widget.set_size_request, -1, -1)
 
     def get_font(self, font_family, point_size):
-        font = GtkHelp.get_font(font_family, point_size)
+        # font descriptions are mutable, so hand out a copy of the cached one
+        resolved_family = font_asst.resolve_alias(font_family, font_family)
+        font = _get_font(font_family, resolved_family, point_size).copy()
         return font
 
     def cfg_expand(self, horizontal='fixed', vertical='fixed'):
@@ -145,7 +196,7 @@ class WidgetBase(Callback.Callbacks):
 
 class TextEntry(WidgetBase):
     def __init__(self, text='', editable=True):
-        super(TextEntry, self).__init__()
+        super().__init__()
 
         w = Gtk.Entry()
         w.set_text(text)
@@ -163,8 +214,8 @@ class TextEntry(WidgetBase):
         self.make_callback('activated')
 
     def _key_press_event(self, widget, event):
-        keyname = Gdk.keyval_name(event.keyval)
-        if keyname == 'Up':
+        keyval = event.keyval
+        if keyval == _KEY_UP:
             try:
                 text = self.history.prev()
                 self.set_text(text)
@@ -172,7 +223,7 @@ class TextEntry(WidgetBase):
             except ValueError:
                 pass
             return True
-        elif keyname == 'Down':
+        elif keyval == _KEY_DOWN:
             try:
                 text = self.history.next()
                 self.set_text(text)
@@ -204,7 +255,7 @@ class TextEntry(WidgetBase):
 
 class TextEntrySet(WidgetBase):
     def __init__(self, text='', editable=True):
-        super(TextEntrySet, self).__init__()
+        super().__init__()
 
         hbox = Gtk.HBox()
         hbox.set_spacing(4)
@@ -244,13 +295,13 @@ class TextEntrySet(WidgetBase):
         pass
 
     def set_enabled(self, tf):
-        super(TextEntrySet, self).set_enabled(tf)
+        super().set_enabled(tf)
         self.entry.set_sensitive(tf)
 
 
 class TextArea(WidgetBase):
     def __init__(self, wrap=False, editable=False):
-        super(TextArea, self).__init__()
+        super().__init__()
 
         tw = Gtk.TextView()
         if wrap:
@@ -268,6 +319,9 @@ class TextArea(WidgetBase):
         self.widget = sw
 
         self.histlimit = 0
+        # number of lines we may go over the limit before trimming, so
+        # that the buffer is trimmed in chunks rather than on every append
+        self.histslack = 0
 
     def append_text(self, text, autoscroll=True):
         buf = self.tw.get_buffer()
@@ -275,7 +329,7 @@ class TextArea(WidgetBase):
         buf.insert(end, text)
 
         if self.histlimit > 0:
-            self._history_housekeeping()
+            self._history_housekeeping(slack=self.histslack)
         if not autoscroll:
             return
 
@@ -292,11 +346,11 @@ class TextArea(WidgetBase):
         buf = self.tw.get_buffer()
         return buf.get_text()
 
-    def _history_housekeeping(self):
+    def _history_housekeeping(self, slack=0):
         # remove some lines to keep us within our history limit
         buf = self.tw.get_buffer()
         numlines = buf.get_line_count()
-        if numlines > self.histlimit:
+        if numlines > self.histlimit + slack:
             rmcount = int(numlines - self.histlimit)
             start = buf.get_iter_at_line(0)
             end = buf.get_iter_at_line(rmcount)
@@ -314,6 +368,7 @@ class TextArea(WidgetBase):
 
     def set_limit(self, numlines):
         self.histlimit = numlines
+        self.histslack = max(1, numlines // 10)
         self._history_housekeeping()
 
     def set_editable(self, tf):
@@ -333,7 +388,7 @@ class TextArea(WidgetBase):
 
 class Label(WidgetBase):
     def __init__(self, text='', halign='left', style='normal', menu=None):
-        super(Label, self).__init__()
+        super().__init__()
 
         label = Gtk.Label(text)
         evbox = Gtk.EventBox()
@@ -357,6 +412,10 @@ class Label(WidgetBase):
         self.menu = menu
         self.evbox = evbox
         self.widget = evbox
+        # button press handlers, by button number
+        self._btn_dispatch = {1: self._activate_cb}
+        if menu is not None:
+            self._btn_dispatch[3] = self._popup_menu_cb
         if style == 'clickable':
             fr = Gtk.Frame()
             fr.set_shadow_type(Gtk.ShadowType.OUT)
@@ -367,15 +426,17 @@ class Label(WidgetBase):
 
     def _cb_redirect(self, widget, event):
         # event.button, event.x, event.y
-        if event.button == 1:
-            self.make_callback('activated')
-            return True
+        handler = self._btn_dispatch.get(event.button, None)
+        if handler is None:
+            return False
+        return handler(event)
 
-        elif event.button == 3 and self.menu is not None:
-            menu_w = self.menu.get_widget()
-            if menu_w.get_sensitive():
-                return menu_w.popup(None, None, None, None,
-                                    event.button, event.time)
+    def _activate_cb(self, event):
+        self.make_callback('activated')
+        return True
+
+    def _popup_menu_cb(self, event):
+        _popup_menu(self.menu.get_widget(), event.button, event.time)
         return False
 
     def _cb_redirect2(self, widget, event):
@@ -400,12 +461,12 @@ class Label(WidgetBase):
         if bg is not None:
             GtkHelp.modify_bg(self.evbox, bg)
         if fg is not None:
-            self.label.modify_fg(Gtk.StateType.NORMAL, Gdk.color_parse(fg))
+            self.label.modify_fg(Gtk.StateType.NORMAL, _parse_color(fg))
 
 
 class Button(WidgetBase):
     def __init__(self, text=''):
-        super(Button, self).__init__()
+        super().__init__()
 
         w = Gtk.Button(text)
         self.widget = w
@@ -425,11 +486,16 @@ class Button(WidgetBase):
 
 class ComboBox(WidgetBase):
     def __init__(self, editable=False):
-        super(ComboBox, self).__init__()
+        super().__init__()
 
         cb = GtkHelp.ComboBox(has_entry=editable)
-        liststore = Gtk.ListStore(GObject.TYPE_STRING)
+        if len(_liststore_pool) > 0:
+            liststore = _liststore_pool.pop()
+        else:
+            liststore = Gtk.ListStore(GObject.TYPE_STRING)
         cb.set_model(liststore)
+        self._liststore = liststore
+        cb.connect('destroy', self._destroy_cb)
         cell = Gtk.CellRendererText()
         cb.pack_start(cell, True)
         cb.add_attribute(cell, 'text', 0)
@@ -437,6 +503,9 @@ class ComboBox(WidgetBase):
             cb.set_entry_text_column(0)
         self.widget = cb
         self.widget.sconnect('changed', self._cb_redirect)
+        # python-side mirror of the model contents, kept in model order,
+        # so that lookups do not have to cross into Gtk for every row
+        self._keys = []
 
         self.enable_callback('activated')
 
@@ -444,53 +513,73 @@ class ComboBox(WidgetBase):
         idx = widget.get_active()
         self.make_callback('activated', idx)
 
+    def _destroy_cb(self, widget):
+        # return our model to the pool for use by another ComboBox
+        liststore, self._liststore = self._liststore, None
+        if liststore is None:
+            return
+        # NOTE: this runs before Gtk's own cleanup.  Block our 'changed'
+        # handler and detach the model before clearing it; otherwise
+        # removing the active row makes us fire 'activated' with -1 and
+        # this (dead) combo box would still share the pooled model
+        widget.handler_block_by_func(widget.cb)
+        widget.set_model(None)
+        if len(_liststore_pool) < _liststore_pool_max:
+            liststore.clear()
+            _liststore_pool.append(liststore)
+
     def insert_alpha(self, text):
-        model = self.widget.get_model()
-        tup = (text, )
-        j = 0
-        for i in range(len(model)):
-            j = i
-            if model[i][0] > text:
-                model.insert(j, tup)
-                return
-        model.insert(j + 1, tup)
+        # NOTE: assumes the items have been added in alphabetical order
+        idx = bisect.bisect_right(self._keys, text)
+        self.insert_text(idx, text)
 
     def append_text(self, text):
-        model = self.widget.get_model()
-        tup = (text, )
-        idx = len(model)
-        model.insert(idx, tup)
+        self.insert_text(len(self._keys), text)
 
     def insert_text(self, idx, text):
+        # Gtk appends for a negative or out of range index, but
+        # list.insert() does not, so normalize it for the mirror
+        if idx < 0 or idx > len(self._keys):
+            idx = len(self._keys)
         model = self.widget.get_model()
         tup = (text, )
         model.insert(idx, tup)
+        self._keys.insert(idx, text)
+
+    def _index_of(self, text):
+        # fast path for lists built with insert_alpha()
+        idx = bisect.bisect_left(self._keys, text)
+        if idx < len(self._keys) and self._keys[idx] == text:
+            return idx
+        try:
+            return self._keys.index(text)
+        except ValueError:
+            return -1
 
     def delete_alpha(self, text):
+        idx = self._index_of(text)
+        if idx < 0:
+            return
         model = self.widget.get_model()
-        for i in range(len(model)):
-            if model[i][0] == text:
-                del model[i]
-                return
+        del model[idx]
+        del self._keys[idx]
 
     def get_alpha(self, idx):
-        model = self.widget.get_model()
-        text = model[idx][0]
-        return text
+        return self._keys[idx]
 
     def clear(self):
         model = self.widget.get_model()
         model.clear()
+        self._keys = []
         if self.widget.get_has_entry():
             entry = self.widget.get_entry()
             entry.set_text('')
 
     def set_text(self, text):
-        model = self.widget.get_model()
-        for i in range(len(model)):
-            if model[i][0] == text:
-                self.widget.set_active(i)
-                return
+        idx = self._index_of(text)
+        if idx >= 0:
+            self.widget.set_active(idx)
+            return
 
         if self.widget.get_has_entry():
             entry = self.widget.get_child()
@@ -516,11 +605,12 @@ class ComboBox(WidgetBase):
 
 class SpinBox(WidgetBase):
     def __init__(self, dtype=int):
-        super(SpinBox, self).__init__()
+        super().__init__()
 
         self.dtype = dtype
         self.widget = GtkHelp.SpinButton()
         self.widget.sconnect('value-changed', self._cb_redirect)
+        self._limits = None
 
         self.enable_callback('value-changed')
 
@@ -538,13 +628,20 @@ class SpinBox(WidgetBase):
         self.widget.set_digits(num)
 
     def set_limits(self, minval, maxval, incr_value=1):
+        limits = (minval, maxval, incr_value)
         adj = self.widget.get_adjustment()
+        if limits == self._limits:
+            # avoid reconfiguring (and redrawing) if nothing has changed,
+            # but reset the value to minval as configure() would
+            adj.set_value(minval)
+            return
+        self._limits = limits
         adj.configure(minval, minval, maxval, incr_value, incr_value, 0)
 
 
 class Slider(WidgetBase):
     def __init__(self, orientation='horizontal', dtype=int, track=False):
-        super(Slider, self).__init__()
+        super().__init__()
 
         # NOTE: parameter dtype is ignored for now for gtk3
 
@@ -556,6 +653,7 @@ class Slider(WidgetBase):
             w = GtkHelp.VScale()
             w.set_size_request(-1, 200)
         self.widget = w
+        self._limits = None
 
         w.set_draw_value(True)
         w.set_value_pos(Gtk.PositionType.BOTTOM)
@@ -583,13 +681,20 @@ class Slider(WidgetBase):
             pass
 
     def set_limits(self, minval, maxval, incr_value=1):
+        limits = (minval, maxval, incr_value)
         adj = self.widget.get_adjustment()
+        if limits == self._limits:
+            # avoid reconfiguring (and redrawing) if nothing has changed,
+            # but reset the value to minval as configure() would
+            adj.set_value(minval)
+            return
+        self._limits = limits
         adj.configure(minval, minval, maxval, incr_value, incr_value, 0)
 
 
 class Dial(WidgetBase):
     def __init__(self, dtype=float, wrap=False, track=False):
-        super(Dial, self).__init__()
+        super().__init__()
 
         w = GtkHelp.ValueDial()
         self.widget = w
@@ -622,7 +727,7 @@ class Dial(WidgetBase):
 
 class ScrollBar(WidgetBase):
     def __init__(self, orientation='horizontal'):
-        super(ScrollBar, self).__init__()
+        super().__init__()
 
         if orientation == 'horizontal':
             self.widget = Gtk.HScrollbar()
@@ -647,7 +752,7 @@ class ScrollBar(WidgetBase):
 
 class CheckBox(WidgetBase):
     def __init__(self, text=''):
-        super(CheckBox, self).__init__()
+        super().__init__()
 
         self.widget = GtkHelp.CheckButton(text)
         self.widget.sconnect('toggled', self._cb_redirect)
@@ -667,7 +772,7 @@ class CheckBox(WidgetBase):
 
 class ToggleButton(WidgetBase):
     def __init__(self, text=''):
-        super(ToggleButton, self).__init__()
+        super().__init__()
 
         w = GtkHelp.ToggleButton(text)
         w.set_mode(True)
@@ -689,7 +794,7 @@ class ToggleButton(WidgetBase):
 
 class RadioButton(WidgetBase):
     def __init__(self, text='', group=None):
-        super(RadioButton, self).__init__()
+        super().__init__()
 
         if group is not None:
             group = group.get_widget()
@@ -714,7 +819,7 @@ class RadioButton(WidgetBase):
 
 class Image(WidgetBase):
     def __init__(self, native_image=None, style='normal', menu=None):
-        super(Image, self).__init__()
+        super().__init__()
 
         if native_image is None:
             native_image = Gtk.Image()
@@ -731,18 +836,16 @@ class Image(WidgetBase):
         self.enable_callback('activated')
 
     def _cb_redirect1(self, widget, event):
-        if event.type == Gdk.EventType.BUTTON_PRESS:
+        if event.type == _BUTTON_PRESS:
             if event.button == 1:
                 self._action = 'click'
 
             elif event.button == 3 and self.menu is not None:
-                menu_w = self.menu.get_widget()
-                if menu_w.get_sensitive():
-                    return menu_w.popup(None, None, None, None,
-                                        event.button, event.time)
+                _popup_menu(self.menu.get_widget(),
+                            event.button, event.time)
 
     def _cb_redirect2(self, widget, event):
-        if event.type == Gdk.EventType.BUTTON_RELEASE:
+        if event.type == _BUTTON_RELEASE:
             if (event.button == 1) and (self._action == 'click'):
                 self._action = None
                 self.make_callback('activated')
@@ -758,7 +861,7 @@ class Image(WidgetBase):
 
 class ProgressBar(WidgetBase):
     def __init__(self):
-        super(ProgressBar, self).__init__()
+        super().__init__()
 
         w = Gtk.ProgressBar()
         # GTK3
@@ -774,44 +877,78 @@ class ProgressBar(WidgetBase):
 
 class StatusBar(WidgetBase):
     def __init__(self):
-        super(StatusBar, self).__init__()
+        super().__init__()
 
         sbar = Gtk.Statusbar()
-        self.ctx_id = None
         self.widget = sbar
+        # context id is fixed for the lifetime of the widget
+        self.ctx_id = sbar.get_context_id('status')
+        # a single timer is used to clear messages: it is only (re)armed
+        # when it is not running or needs to fire earlier, and otherwise
+        # checks the deadline of the current message when it fires
         self.statustask = None
+        self._task_time = None
+        self._deadline = None
 
     def clear_message(self):
+        self._deadline = None
+        self.widget.remove_all(self.ctx_id)
+
+    def _set_timer(self, fire_time):
+        if self.statustask is not None:
+            GObject.source_remove(self.statustask)
+        # round up, so that the timer does not fire before the deadline
+        delay_ms = max(0, math.ceil(1000 * (fire_time - time.monotonic())))
+        self._task_time = fire_time
+        self.statustask = GObject.timeout_add(delay_ms, self._timer_cb)
+
+    def _timer_cb(self):
         self.statustask = None
-        if self.ctx_id is not None:
-            try:
-                self.widget.remove_all(self.ctx_id)
-            except Exception:
-                pass
-            self.ctx_id = None
+        if self._deadline is None:
+            # no message pending removal
+            return False
+        # NOTE: allow for the millisecond resolution of the timer
+        if time.monotonic() < self._deadline - 0.001:
+            # message was replaced since the timer was set
+            self._set_timer(self._deadline)
+            return False
+        self.clear_message()
+        return False
 
     def set_message(self, msg_str, duration=10.0):
-        try:
-            if self.ctx_id is not None:
-                self.widget.remove_all(self.ctx_id)
-        except Exception:
-            pass
-        self.ctx_id = self.widget.get_context_id('status')
+        self.widget.remove_all(self.ctx_id)
         self.widget.push(self.ctx_id, msg_str)
 
         # remove message in about `duration` seconds
-        if self.statustask is not None:
-            GObject.source_remove(self.statustask)
-            self.statustask = None
         if duration > 0.0:
-            self.statustask = GObject.timeout_add(int(1000 * duration),
-                                                  self.clear_message)
+            self._deadline = time.monotonic() + duration
+            if self.statustask is None or self._deadline < self._task_time:
+                self._set_timer(self._deadline)
+        else:
+            self._deadline = None
+
+
+def _tv_text_value(val):
+    return '' if val is None else str(val)
+
+
+def _tv_icon_value(val):
+    return val if isinstance(val, GdkPixbuf.Pixbuf) else None
+
+
+def _tv_str_sort_key(val):
+    return val.lower() if isinstance(val, str) else ''
+
+
+def _tv_num_sort_key(val):
+    # non-numeric values (including interior node names) sort first
+    return float(val) if isinstance(val, numbers.Real) else float('-inf')
 
 
 class TreeView(WidgetBase):
     def __init__(self, auto_expand=False, sortable=False, selection='single',
                  use_alt_row_color=False, dragable=False):
-        super(TreeView, self).__init__()
+        super().__init__()
 
         self.auto_expand = auto_expand
         self.sortable = sortable
@@ -822,6 +959,8 @@ class TreeView(WidgetBase):
         self.leaf_idx = 0
         self.columns = []
         self.datakeys = []
+        self.display_fns = []
+        self.sort_key_fns = []
         # shadow index
         self.shadow = {}
 
@@ -874,10 +1013,7 @@ class TreeView(WidgetBase):
 
         self.datakeys = datakeys
         self.leaf_idx = datakeys.index(self.leaf_key)
-        # make sort functions
-        self.cell_sort_funcs = []
-        for kwd in self.datakeys:
-            self.cell_sort_funcs.append(self._mksrtfnN(kwd))
+        self.display_fns = []
 
         # Remove old columns, if any
         for col in list(self.tv.get_columns()):
@@ -888,57 +1024,107 @@ class TreeView(WidgetBase):
             kwd = self.datakeys[n]
             if kwd == 'icon':
                 cell = Gtk.CellRendererPixbuf()
+                attr = 'pixbuf'
+                self.display_fns.append(_tv_icon_value)
             else:
                 cell = Gtk.CellRendererText()
+                attr = 'text'
+                self.display_fns.append(_tv_text_value)
             cell.set_padding(2, 0)
+            # cell.set_property('xalign', 1.0)
             header = headers[n]
-            tvc = Gtk.TreeViewColumn(header, cell)
+            # cell contents come straight from the typed display column
+            # for this column in the model (see _new_model())
+            tvc = Gtk.TreeViewColumn(header, cell, **{attr: n + 1})
             tvc.set_resizable(True)
             if self.sortable:
                 tvc.connect('clicked', self.sort_cb, n)
                 tvc.set_clickable(True)
-            if n == 0:
-                fn_data = self._mkcolfn0(kwd)
-                # cell.set_property('xalign', 1.0)
-            else:
-                fn_data = self._mkcolfnN(kwd)
-            tvc.set_cell_data_func(cell, fn_data)
             self.tv.append_column(tvc)
 
-        treemodel = Gtk.TreeStore(object)
-        self.tv.set_fixed_height_mode(False)
+        # NOTE: fixed height mode is not used, because Gtk requires all
+        # columns to have fixed sizing for it, which would defeat
+        # set_optimal_column_widths()
+        treemodel = self._new_model()
         self.tv.set_model(treemodel)
-        # This speeds up rendering of TreeViews
-        self.tv.set_fixed_height_mode(True)
+
+    def _new_model(self, leaves=()):
+        # column 0 holds the node; this is followed by a display column
+        # for each table column (a pixbuf for icons, otherwise text) and
+        # then by a sort key for each table column, so that Gtk can render
+        # and sort natively.  A column is sorted as numbers only if it has
+        # values in `leaves` and all of them are numeric (bools excluded);
+        # all others are sorted as lowercased strings.
+        # NOTE: column types cannot change once rows are in the model, so
+        # the sort key types are fixed by the leaves of the first batch
+        # added to an empty table (see set_tree() and add_tree()).
+        types = [object]
+        for display_fn in self.display_fns:
+            types.append(GdkPixbuf.Pixbuf if display_fn is _tv_icon_value
+                         else str)
+        numeric = [None] * len(self.datakeys)
+        for leaf in leaves:
+            for i, kwd in enumerate(self.datakeys):
+                val = leaf.get(kwd, None)
+                if val is None or numeric[i] is False:
+                    continue
+                numeric[i] = (isinstance(val, numbers.Real) and
+                              not isinstance(val, bool))
+        self.sort_key_fns = []
+        for is_num in numeric:
+            if is_num:
+                types.append(float)
+                self.sort_key_fns.append(_tv_num_sort_key)
+            else:
+                types.append(str)
+                self.sort_key_fns.append(_tv_str_sort_key)
+        return Gtk.TreeStore(*types)
+
+    def _get_leaves(self, tree_dict):
+        nodes = [tree_dict]
+        for level in range(self.levels):
+            nodes = [child for node in nodes for child in node.values()]
+        return nodes
 
     def set_tree(self, tree_dict):
         self.clear()
 
-        model = Gtk.TreeStore(object)
+        model = self._new_model(leaves=self._get_leaves(tree_dict))
         self._add_tree(model, tree_dict)
 
     def add_tree(self, tree_dict):
         model = self.tv.get_model()
+        if len(self.shadow) == 0:
+            # table is empty, so the sort key types can still be chosen
+            # from the data
+            leaves = self._get_leaves(tree_dict)
+            if len(leaves) > 0:
+                sort_id, order = model.get_sort_column_id()
+                model = self._new_model(leaves=leaves)
+                if sort_id is not None:
+                    model.set_sort_column_id(sort_id, order)
         self._add_tree(model, tree_dict)
 
     def _add_tree(self, model, tree_dict):
 
-        # Hack to get around slow TreeView scrolling with large lists
-        self.tv.set_fixed_height_mode(False)
+        datakeys = tuple(zip(self.datakeys, self.display_fns,
+                             self.sort_key_fns))
 
+        # NOTE: for set_tree() the model is not yet attached to the view,
+        # so the view does not have to respond to each inserted row
         for key in tree_dict:
-            self._add_subtree(1, self.shadow,
-                              model, None, key, tree_dict[key])
-
-        self.tv.set_model(model)
+            self._add_subtree(1, self.shadow, model, None,
+                              key, tree_dict[key], datakeys)
 
-        self.tv.set_fixed_height_mode(True)
+        if self.tv.get_model() is not model:
+            self.tv.set_model(model)
 
         # User wants auto expand?
         if self.auto_expand:
             self.tv.expand_all()
 
-    def _add_subtree(self, level, shadow, model, parent_item, key, node):
+    def _add_subtree(self, level, shadow, model, parent_item, key, node,
+                     datakeys):
 
         if level >= self.levels:
             # leaf node
@@ -949,7 +1135,13 @@ class TreeView(WidgetBase):
 
             except KeyError:
                 # new item
-                item_iter = model.append(parent_item, [node])
+                vals = [node.get(kwd, None) for kwd, _, _ in datakeys]
+                row = [node]
+                row.extend([display_fn(val) for val, (_, display_fn, _)
+                            in zip(vals, datakeys)])
+                row.extend([sort_key_fn(val) for val, (_, _, sort_key_fn)
+                            in zip(vals, datakeys)])
+                item_iter = model.append(parent_item, row)
                 shadow[key] = Bunch.Bunch(node=node, item=item_iter,
                                           terminal=True)
 
@@ -962,13 +1154,21 @@ class TreeView(WidgetBase):
 
             except KeyError:
                 # new node
-                item = model.append(None, [str(key)])
+                # interior nodes show their name in the first column only
+                name = str(key)
+                row = [name]
+                row.extend([display_fn(name if i == 0 else None)
+                            for i, (_, display_fn, _) in enumerate(datakeys)])
+                row.extend([sort_key_fn(name)
+                            for _, _, sort_key_fn in datakeys])
+                item = model.append(None, row)
                 d = {}
                 shadow[key] = Bunch.Bunch(node=d, item=item, terminal=False)
 
             # recurse for non-leaf interior node
             for key in node:
-                self._add_subtree(level + 1, d, model, item, key, node[key])
+                self._add_subtree(level + 1, d, model, item, key, node[key],
+                                  datakeys)
 
     def _selection_cb(self, treeview):
         path, column = treeview.get_cursor()
@@ -1031,7 +1231,7 @@ class TreeView(WidgetBase):
         return res_dict
 
     def clear(self):
-        model = Gtk.TreeStore(object)
+        model = self._new_model()
         self.tv.set_model(model)
         self.shadow = {}
 
@@ -1071,9 +1271,14 @@ class TreeView(WidgetBase):
         treepath = model.get_path(item)
         self.tv.scroll_to_cell(treepath, use_align=True, row_align=0.5)
 
+    def _get_sort_column(self, i):
+        # model column holding the sort keys for table column i
+        return 1 + len(self.datakeys) + i
+
     def sort_on_column(self, i):
         model = self.tv.get_model()
-        model.set_sort_column_id(i, Gtk.SortType.ASCENDING)
+        model.set_sort_column_id(self._get_sort_column(i),
+                                 Gtk.SortType.ASCENDING)
 
     def set_column_width(self, i, width):
         col = self.tv.get_column(i)
@@ -1097,62 +1302,10 @@ class TreeView(WidgetBase):
     def sort_cb(self, column, idx):
         treeview = column.get_tree_view()
         model = treeview.get_model()
-        model.set_sort_column_id(idx, Gtk.SortType.ASCENDING)
-        fn = self.cell_sort_funcs[idx]
-        model.set_sort_func(idx, fn)
+        model.set_sort_column_id(self._get_sort_column(idx),
+                                 Gtk.SortType.ASCENDING)
         return True
 
-    def _mksrtfnN(self, idx):
-        def fn(*args):
-            model, iter1, iter2 = args[:3]
-            bnch1 = model.get_value(iter1, 0)
-            bnch2 = model.get_value(iter2, 0)
-            if isinstance(bnch1, str):
-                if isinstance(bnch2, str):
-                    s1, s2 = bnch1.lower(), bnch2.lower()
-                    if s1 < s2:
-                        return -1
-                    if s1 > s2:
-                        return 1
-                return 0
-            val1, val2 = bnch1[idx], bnch2[idx]
-            if isinstance(val1, str):
-                val1, val2 = val1.lower(), val2.lower()
-                if val1 < val2:
-                    return -1
-                if val1 > val2:
-                    return 1
-            return 0
-        return fn
-
-    def _mkcolfn0(self, idx):
-        def fn(*args):
-            column, cell, model, iter = args[:4]
-            bnch = model.get_value(iter, 0)
-            if isinstance(bnch, str):
-                cell.set_property('text', bnch)
-            elif isinstance(bnch, GdkPixbuf.Pixbuf):
-                cell.set_property('pixbuf', bnch)
-            elif isinstance(bnch[idx], GdkPixbuf.Pixbuf):
-                cell.set_property('pixbuf', bnch[idx])
-            else:
-                cell.set_property('text', bnch[idx])
-        return fn
-
-    def _mkcolfnN(self, idx):
-        def fn(*args):
-            column, cell, model, iter = args[:4]
-            bnch = model.get_value(iter, 0)
-            if isinstance(bnch, str):
-                cell.set_property('text', '')
-            elif isinstance(bnch, GdkPixbuf.Pixbuf):
-                cell.set_property('text', '')
-            elif isinstance(bnch[idx], GdkPixbuf.Pixbuf):
-                cell.set_property('pixbuf', bnch[idx])
-            else:
-                cell.set_property('text', str(bnch[idx]))
-        return fn
-
     def _start_drag(self, treeview, context, selection,
                     info, timestamp):
         res_dict = self.get_selected()
@@ -1166,8 +1319,8 @@ class WebView(WidgetBase):
         if not has_webkit:
             raise NotImplementedError("Missing webkit")
 
-        super(WebView, self).__init__()
-        self.widget = WebKit.WebView()
+        super().__init__()
+        self.widget = _get_webkit().WebView()
 
     def load_url(self, url):
         self.widget.open(url)
@@ -1188,12 +1341,27 @@ class WebView(WidgetBase):
         self.widget.stop_loading()
 
 
+def _get_webkit():
+    global WebKit, has_webkit
+    if WebKit is None:
+        try:
+            from gi.repository import WebKit2
+        except Exception:
+            # typelib is registered, but the library could not be loaded
+            has_webkit = False
+            raise NotImplementedError("Missing webkit")
+        WebKit = WebKit2
+    return WebKit
+
+
 # CONTAINERS
 
 class ContainerBase(WidgetBase):
     def __init__(self):
-        super(ContainerBase, self).__init__()
+        super().__init__()
         self.children = []
+        # for fast membership tests on children
+        self._child_set = set()
 
         for name in ['widget-added', 'widget-removed']:
             self.enable_callback(name)
@@ -1201,6 +1369,11 @@ class ContainerBase(WidgetBase):
     def add_ref(self, ref):
         # TODO: should this be a weakref?
         self.children.append(ref)
+        self._child_set.add(ref)
+
+    def _remove_ref(self, ref):
+        self._child_set.discard(ref)
+        self.children.remove(ref)
 
     def _remove(self, childw, delete=False):
         self.widget.remove(childw)
@@ -1208,16 +1381,21 @@ class ContainerBase(WidgetBase):
             childw.destroy()
 
     def remove(self, child, delete=False):
-        if child not in self.children:
+        if child not in self._child_set:
             raise KeyError("Widget is not a child of this container")
-        self.children.remove(child)
+        self._remove_ref(child)
 
         self._remove(child.get_widget(), delete=delete)
         self.make_callback('widget-removed', child)
 
     def remove_all(self, delete=False):
-        for child in list(self.children):
-            self.remove(child, delete=delete)
+        # detach the whole list at once rather than calling remove() per
+        # child, which has to search the list for each one
+        children, self.children = self.children, []
+        self._child_set = set()
+        for child in children:
+            self._remove(child.get_widget(), delete=delete)
+            self.make_callback('widget-removed', child)
 
     def get_children(self):
         return self.children
@@ -1246,7 +1424,7 @@ class ContainerBase(WidgetBase):
 
 class Box(ContainerBase):
     def __init__(self, orientation='horizontal'):
-        super(Box, self).__init__()
+        super().__init__()
 
         if orientation == 'horizontal':
             self.widget = Gtk.HBox()
@@ -1263,7 +1441,10 @@ class Box(ContainerBase):
         self.widget.pack_start(child_w, expand, True, 0)
         self.widget.reorder_child(child_w, idx)
         self.children.insert(idx, child)
-        self.widget.show_all()
+        self._child_set.add(child)
+        # show only the new child instead of walking the whole container
+        child_w.show_all()
+        self.widget.show()
         self.make_callback('widget-added', child)
 
     def add_widget(self, child, stretch=0.0):
@@ -1272,23 +1453,24 @@ class Box(ContainerBase):
         # TODO: can this be made more accurate?
         expand = (float(stretch) > 0.0)
         self.widget.pack_start(child_w, expand, True, 0)
-        self.widget.show_all()
+        child_w.show_all()
+        self.widget.show()
         self.make_callback('widget-added', child)
 
 
 class VBox(Box):
     def __init__(self):
-        super(VBox, self).__init__(orientation='vertical')
+        super().__init__(orientation='vertical')
 
 
 class HBox(Box):
     def __init__(self):
-        super(HBox, self).__init__(orientation='horizontal')
+        super().__init__(orientation='horizontal')
 
 
 class Frame(ContainerBase):
     def __init__(self, title=None):
-        super(Frame, self).__init__()
+        super().__init__()
 
         fr = Gtk.Frame(label=title)
         fr.set_shadow_type(Gtk.ShadowType.ETCHED_IN)
@@ -1298,8 +1480,10 @@ class Frame(ContainerBase):
     def set_widget(self, child):
         self.remove_all()
         self.add_ref(child)
-        self.widget.add(child.get_widget())
-        self.widget.show_all()
+        child_w = child.get_widget()
+        self.widget.add(child_w)
+        child_w.show_all()
+        self.widget.show()
 
     def set_text(self, text):
         w = self.get_widget()
@@ -1312,7 +1496,7 @@ class Expander(ContainerBase):
     d_arrow = None
 
     def __init__(self, title=None, notoggle=False):
-        super(Expander, self).__init__()
+        super().__init__()
 
         vbox = VBox()
         vbox.set_margins(0, 0, 0, 0)
@@ -1376,7 +1560,7 @@ class Expander(ContainerBase):
 class TabWidget(ContainerBase):
     def __init__(self, tabpos='top', reorderable=False, detachable=True,
                  group=0):
-        super(TabWidget, self).__init__()
+        super().__init__()
 
         self.reorderable = reorderable
         self.detachable = detachable
@@ -1416,7 +1600,7 @@ class TabWidget(ContainerBase):
         child = self._native_to_child(nchild_w)
         # remove child
         # (native widget already has been removed by gtk)
-        self.children.remove(child)
+        self._remove_ref(child)
 
         # nchild_w.unparent()
         self.make_callback('page-detach', child)
@@ -1430,7 +1614,7 @@ class TabWidget(ContainerBase):
                 child = event.child
                 # remove child from src tab
                 # (native widget already has been removed by gtk)
-                event.src_widget.children.remove(child)
+                event.src_widget._remove_ref(child)
                 # add child to us
                 # (native widget already has been added by gtk)
                 self.add_ref(child)
@@ -1466,7 +1650,8 @@ class TabWidget(ContainerBase):
             self.widget.set_tab_reorderable(child_w, True)
         if self.detachable:
             self.widget.set_tab_detachable(child_w, True)
-        self.widget.show_all()
+        child_w.show_all()
+        self.widget.show()
         # attach title to child
         child.extdata.tab_title = title
         self.make_callback('widget-added', child)
@@ -1499,7 +1684,7 @@ class TabWidget(ContainerBase):
 
 class StackWidget(TabWidget):
     def __init__(self):
-        super(StackWidget, self).__init__()
+        super().__init__()
 
         nb = self.widget
         # nb.set_scrollable(False)
@@ -1510,7 +1695,7 @@ class StackWidget(TabWidget):
 class MDIWidget(ContainerBase):
 
     def __init__(self, tabpos='top', mode='tabs'):
-        super(MDIWidget, self).__init__()
+        super().__init__()
 
         self.mode = 'mdi'
         self.true_mdi = True
@@ -1689,7 +1874,7 @@ class MDIWindow(WidgetBase):
 
 class ScrollArea(ContainerBase):
     def __init__(self):
-        super(ScrollArea, self).__init__()
+        super().__init__()
 
         sw = Gtk.ScrolledWindow()
         sw.set_border_width(2)
@@ -1710,7 +1895,9 @@ class ScrollArea(ContainerBase):
         self.remove_all()
         self.add_ref(child)
         self.widget.add_with_viewport(child.get_widget())
-        self.widget.show_all()
+        # the viewport is created implicitly, so show that as well
+        self.widget.get_child().show_all()
+        self.widget.show()
 
     def scroll_to_end(self, vertical=True, horizontal=False):
         if vertical:
@@ -1725,7 +1912,7 @@ class ScrollArea(ContainerBase):
 
 class Splitter(ContainerBase):
     def __init__(self, orientation='horizontal', thumb_px=8):
-        super(Splitter, self).__init__()
+        super().__init__()
 
         # thumb_px ignored in this version
         self.orientation = orientation
@@ -1763,8 +1950,11 @@ class Splitter(ContainerBase):
 
             w.pack1(frame_w)
             last.pack2(w)
+            w.show()
 
-        self.widget.show_all()
+        # show only what was added, rather than walking all the panes
+        frame_w.show_all()
+        self.widget.show()
         self.make_callback('widget-added', child)
 
     def _get_sizes(self, pane):
@@ -1795,7 +1985,7 @@ class Splitter(ContainerBase):
 
 class Splitter2(ContainerBase):
     def __init__(self, orientation='horizontal', thumb_px=8):
-        super(Splitter, self).__init__()
+        super().__init__()
 
         self.orientation = orientation
         self.widget = GtkHelp.Splitter(orientation=self.orientation,
@@ -1824,7 +2014,7 @@ class Splitter2(ContainerBase):
 
 class GridBox(ContainerBase):
     def __init__(self, rows=1, columns=1):
-        super(GridBox, self).__init__()
+        super().__init__()
 
         # TODO: GtkTable has been deprecated--migrate to GtkGrid?
         w = Gtk.Table(rows=rows, columns=columns)
@@ -1871,18 +2061,12 @@ class GridBox(ContainerBase):
         self.tbl[key] = child
         self.add_ref(child)
         w = child.get_widget()
-        if stretch > 0:
-            xoptions = (Gtk.AttachOptions.EXPAND | Gtk.AttachOptions.SHRINK |
-                        Gtk.AttachOptions.FILL)
-            yoptions = (Gtk.AttachOptions.EXPAND | Gtk.AttachOptions.SHRINK |
-                        Gtk.AttachOptions.FILL)
-        else:
-            xoptions = (Gtk.AttachOptions.FILL | Gtk.AttachOptions.SHRINK)
-            yoptions = (Gtk.AttachOptions.FILL | Gtk.AttachOptions.SHRINK)
+        options = _ATTACH_STRETCH if stretch > 0 else _ATTACH_FIXED
+        # args: left, right, top, bottom, xoptions, yoptions, xpad, ypad
         self.widget.attach(w, col, col + 1, row, row + 1,
-                           xoptions=xoptions, yoptions=yoptions,
-                           xpadding=0, ypadding=0)
-        self.widget.show_all()
+                           options, options, 0, 0)
+        w.show_all()
+        self.widget.show()
         self.make_callback('widget-added', child)
 
     def remove(self, child, delete=False):
@@ -1896,6 +2080,10 @@ class GridBox(ContainerBase):
             key = keys[idx]
             del self.tbl[key]
 
+    def remove_all(self, delete=False):
+        super().remove_all(delete=delete)
+        self.tbl = {}
+
     def get_widget_at_cell(self, row, col):
         return self.tbl[(row, col)]
 
@@ -1905,8 +2093,7 @@ class GridBox(ContainerBase):
 
         self.resize_grid(self.num_rows + 1, self.num_cols)
 
-        xoptions = (Gtk.AttachOptions.FILL | Gtk.AttachOptions.SHRINK)
-        yoptions = (Gtk.AttachOptions.FILL | Gtk.AttachOptions.SHRINK)
+        attach, options = self.widget.attach, _ATTACH_FIXED
 
         # handle case where user inserts row before the end of the gridbox
         if index < self.num_rows:
@@ -1921,9 +2108,8 @@ class GridBox(ContainerBase):
                         w = child.get_widget()
                         self._remove(w)
                         row, col = i + 1, j
-                        self.widget.attach(w, col, col + 1, row, row + 1,
-                                           xoptions=xoptions, yoptions=yoptions,
-                                           xpadding=0, ypadding=0)
+                        attach(w, col, col + 1, row, row + 1,
+                               options, options, 0, 0)
 
         for j in range(self.num_cols):
             child = widgets[j]
@@ -1932,12 +2118,13 @@ class GridBox(ContainerBase):
             self.add_ref(child)
             row, col = index, j
             w = child.get_widget()
-            self.widget.attach(w, col, col + 1, row, row + 1,
-                               xoptions=xoptions, yoptions=yoptions,
-                               xpadding=0, ypadding=0)
+            attach(w, col, col + 1, row, row + 1,
+                   options, options, 0, 0)
 
         self.num_rows += 1
-        self.widget.show_all()
+        for child in widgets:
+            child.get_widget().show_all()
+        self.widget.show()
 
         for child in widgets:
             self.make_callback('widget-added', child)
@@ -1950,8 +2137,7 @@ class GridBox(ContainerBase):
         if index < 0 or index >= self.num_rows:
             raise ValueError("Index ({}) out of bounds ({})".format(index, self.num_rows))
 
-        xoptions = (Gtk.AttachOptions.FILL | Gtk.AttachOptions.SHRINK)
-        yoptions = (Gtk.AttachOptions.FILL | Gtk.AttachOptions.SHRINK)
+        attach, options = self.widget.attach, _ATTACH_FIXED
 
         # remove widgets in row from table
         for j in range(self.num_cols):
@@ -1973,9 +2159,8 @@ class GridBox(ContainerBase):
                         w = child.get_widget()
                         self._remove(w)
                         row, col = i - 1, j
-                        self.widget.attach(w, col, col + 1, row, row + 1,
-                                           xoptions=xoptions, yoptions=yoptions,
-                                           xpadding=0, ypadding=0)
+                        attach(w, col, col + 1, row, row + 1,
+                               options, options, 0, 0)
 
         self.num_rows -= 1
         self.resize_grid(self.num_rows, self.num_cols)
@@ -1983,7 +2168,7 @@ class GridBox(ContainerBase):
 
 class Toolbar(ContainerBase):
     def __init__(self, orientation='horizontal'):
-        super(Toolbar, self).__init__()
+        super().__init__()
 
         w = Gtk.Toolbar()
         w.set_style(Gtk.ToolbarStyle.ICONS)
@@ -2019,7 +2204,9 @@ class Toolbar(ContainerBase):
         tool_w = Gtk.ToolItem.new()
         w = child.get_widget()
         tool_w.add(w)
-        w.show()
+        # show_all(), since the child may be a composite (e.g. from
+        # build_info()) whose widgets have not been shown
+        w.show_all()
         tool = ContainerBase()
         tool.widget = tool_w
         tool_w.show()
@@ -2051,7 +2238,7 @@ class Toolbar(ContainerBase):
 
 class MenuAction(WidgetBase):
     def __init__(self, text=None, checkable=False):
-        super(MenuAction, self).__init__()
+        super().__init__()
 
         self.text = text
         self.checkable = checkable
@@ -2084,17 +2271,28 @@ class MenuAction(WidgetBase):
 
 class Menu(ContainerBase):
     def __init__(self):
-        super(Menu, self).__init__()
+        super().__init__()
 
         self.widget = Gtk.Menu()
         self.menus = Bunch.Bunch(caseless=True)
+        self.widget.connect('destroy', self._destroy_cb)
         self.widget.show()
 
+    def _destroy_cb(self, menu_w):
+        # pull our separators out before they are finalized along with
+        # the menu, so that they can be used by another Menu
+        for child_w in menu_w.get_children():
+            if len(_separator_pool) >= _separator_pool_max:
+                break
+            if isinstance(child_w, Gtk.SeparatorMenuItem):
+                menu_w.remove(child_w)
+                _separator_pool.append(child_w)
+
     def add_widget(self, child):
         menuitem_w = child.get_widget()
         self.widget.append(menuitem_w)
         self.add_ref(child)
-        # self.widget.show_all()
+        menuitem_w.show_all()
         self.make_callback('widget-added', child)
 
     def add_name(self, name, checkable=False):
@@ -2107,7 +2305,7 @@ class Menu(ContainerBase):
         child = Menu()
         self.add_ref(child)
         self.menus[name] = child
-        item_w.set_submenu(child.get_widget())
+        item_w.set_submenu(child.widget)
         self.widget.append(item_w)
         item_w.show()
         return child
@@ -2116,21 +2314,22 @@ class Menu(ContainerBase):
         return self.menus[name]
 
     def add_separator(self):
-        sep = Gtk.SeparatorMenuItem()
+        if len(_separator_pool) > 0:
+            sep = _separator_pool.pop()
+        else:
+            sep = Gtk.SeparatorMenuItem()
         self.widget.append(sep)
         sep.show()
 
     def popup(self, widget=None):
         menu = self.widget
         menu.show_all()
-        now = int(0)
-        if menu.get_sensitive():
-            menu.popup(None, None, None, None, 0, now)
+        _popup_menu(menu)
 
 
 class Menubar(ContainerBase):
     def __init__(self):
-        super(Menubar, self).__init__()
+        super().__init__()
 
         self.widget = Gtk.MenuBar()
         self.menus = Bunch.Bunch(caseless=True)
@@ -2139,7 +2338,7 @@ class Menubar(ContainerBase):
         if not isinstance(child, Menu):
             raise ValueError("child widget needs to be a Menu object")
         item_w = Gtk.MenuItem(label=name)
-        item_w.set_submenu(child.get_widget())
+        item_w.set_submenu(child.widget)
         self.add_ref(child)
         self.widget.append(item_w)
         self.menus[name] = child
@@ -2152,7 +2351,7 @@ class Menubar(ContainerBase):
         child = Menu()
         self.add_ref(child)
         self.menus[name] = child
-        item_w.set_submenu(child.get_widget())
+        item_w.set_submenu(child.widget)
         self.widget.append(item_w)
         item_w.show()
         return child
@@ -2165,8 +2364,11 @@ class TopLevelMixin(object):
 
     def __init__(self, title=None):
         self._fullscreen = False
+        # cached Gdk window (see _get_gdk_window())
+        self._gdk_window = None
 
         self.widget.connect("destroy", self._quit)
+        self.widget.connect("unrealize", self._unrealize_event)
         self.widget.connect("delete_event", self._close_event)
         self.widget.connect("window_state_event", self._window_event)
         self.widget.connect("configure-event", self._configure_event)
@@ -2183,8 +2385,20 @@ class TopLevelMixin(object):
         self.widget.hide()
 
     def _quit(self, *args):
+        self._gdk_window = None
         self.close()
 
+    def _unrealize_event(self, widget):
+        # Gdk window goes away when the widget is unrealized
+        self._gdk_window = None
+
+    def _get_gdk_window(self):
+        window = self._gdk_window
+        if window is None:
+            # NOTE: this is None until the widget is realized
+            window = self._gdk_window = self.widget.get_window()
+        return window
+
     def _close_event(self, widget, event):
         try:
             self.close()
@@ -2194,8 +2408,7 @@ class TopLevelMixin(object):
             return True
 
     def _window_event(self, widget, event):
-        if ((event.changed_mask & Gdk.WindowState.FULLSCREEN) or
-                (event.changed_mask & Gdk.WindowState.MAXIMIZED)):
+        if event.changed_mask & _WS_FULL_OR_MAX:
             self._fullscreen = True
         else:
             self._fullscreen = False
@@ -2234,7 +2447,7 @@ class TopLevelMixin(object):
 
     def get_pos(self):
         res = None
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             res = window.get_origin()
             if isinstance(res, tuple) and len(res) == 2:
@@ -2245,47 +2458,46 @@ class TopLevelMixin(object):
         return x, y
 
     def raise_(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.raise_()
 
     def lower(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.lower()
 
     def focus(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.focus()
 
     def move(self, x, y):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.move(x, y)
 
     def maximize(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.maximize()
 
     def unmaximize(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.unmaximize()
 
     def is_maximized(self):
-        window = self.widget.get_window()
-        mask = Gdk.WindowState.MAXIMIZED
-        return window.get_state() & mask != 0
+        window = self._get_gdk_window()
+        return window.get_state() & _WS_MAXIMIZED != 0
 
     def fullscreen(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.fullscreen()
 
     def unfullscreen(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.unfullscreen()
 
@@ -2293,12 +2505,12 @@ class TopLevelMixin(object):
         return self._fullscreen
 
     def iconify(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.iconify()
 
     def uniconify(self):
-        window = self.widget.get_window()
+        window = self._get_gdk_window()
         if window is not None:
             window.deiconify()
 
@@ -2330,8 +2542,8 @@ class TopLevel(TopLevelMixin, ContainerBase):
 class Application(Callback.Callbacks):
 
     def __init__(self, logger=None, settings=None):
-        global _app
-        super(Application, self).__init__()
+        global _app, _screen_info
+        super().__init__()
 
         self.logger = logger
         if settings is None:
@@ -2339,30 +2551,36 @@ class Application(Callback.Callbacks):
         self.settings = settings
         self.settings.add_defaults(font_scaling_factor=None)
 
-        self.window_list = []
         self.window_dict = {}
         self.wincnt = 0
 
-        try:
-            display = Gdk.Display.get_default()
-            screen = display.get_default_screen()
-            window = screen.get_active_window()
-            monitor = screen.get_monitor_at_window(window)
+        if _screen_info is None:
+            # screen dimensions do not change during a session, so only
+            # look them up for the first Application
+            try:
+                display = Gdk.Display.get_default()
+                screen = display.get_default_screen()
+                window = screen.get_active_window()
+                monitor = screen.get_monitor_at_window(window)
 
-            g = screen.get_monitor_geometry(monitor)
-            self.screen_ht = g.height
-            self.screen_wd = g.width
+                g = screen.get_monitor_geometry(monitor)
+                _screen_info = (g.width, g.height, screen.get_resolution())
+            except (AttributeError, TypeError) as e:
+                # no default display, or no active window to find a monitor
+                if self.logger is not None:
+                    self.logger.debug("can't get screen dimensions: {}".format(e))
 
-            self.screen_res = screen.get_resolution()
+        if _screen_info is not None:
+            self.screen_wd, self.screen_ht, self.screen_res = _screen_info
 
             scale = self.settings.get('font_scaling_factor', None)
             if scale is None:
                 # hack for Gtk--scale fonts on HiDPI displays
                 scale = self.screen_res / 72.0
-            self.logger.debug("setting default font_scaling_factor={}".format(scale))
-            from ginga.fonts import font_asst
+            if self.logger is not None:
+                self.logger.debug("setting default font_scaling_factor={}".format(scale))
             font_asst.default_scaling_factor = scale
-        except Exception as e:
+        else:
             self.screen_wd = 1600
             self.screen_ht = 1200
             self.screen_res = 96
@@ -2384,11 +2602,16 @@ class Application(Callback.Callbacks):
     def get_screen_size(self):
         return (self.screen_wd, self.screen_ht)
 
-    def process_events(self):
-
-        while Gtk.events_pending():
+    def process_events(self, max_events=256):
+        # process at most `max_events` events per call, so that a flood
+        # of events cannot starve the caller
+        events_pending = Gtk.events_pending
+        main_iteration_do = Gtk.main_iteration_do
+        count = 0
+        while count < max_events and events_pending():
+            count += 1
             try:
-                Gtk.main_iteration()
+                main_iteration_do(False)
                 # TEMP: to help solve the issue of gtk3 events getting
                 # lost--we want to know whether the process_event loop
                 # is running, so ping periodically if events are showing
@@ -2407,7 +2630,7 @@ class Application(Callback.Callbacks):
 
     def add_window(self, window, wid=None):
         if wid is None:
-            wid = 'win%d' % (self.wincnt)
+            wid = f'win{self.wincnt}'
             self.wincnt += 1
         window.wid = wid
         window.url = ''
@@ -2489,34 +2712,54 @@ class Dialog(TopLevelMixin, WidgetBase):
         return self.content
 
 
+# file filters known to SaveDialog: keyword -> (filter name, extension)
+_save_filters = {
+    'png': ('Image (*.png)', '.png'),
+    'avi': ('Movie (*.avi)', '.avi'),
+    'npz': ('Numpy Compressed Archive (*.npz)', '.npz'),
+}
+
+
 class SaveDialog(object):
     def __init__(self, title='Save File', selectedfilter=None):
+        self.title = title
+        self.selectedfilter = selectedfilter
+        self._filter_pattern = selectedfilter
+        self._filter_name = None
+
+        if selectedfilter is not None:
+            for key, (name, ext) in _save_filters.items():
+                if key in selectedfilter:
+                    self._filter_name = name
+                    self.selectedfilter = ext
+                    break
+
+        # the file chooser is expensive to create, so it is not made
+        # until get_path() is called
+        self.widget = None
+
+    def _make_dialog(self):
         action = Gtk.FileChooserAction.SAVE
         buttons = (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
                    Gtk.STOCK_SAVE, Gtk.ResponseType.OK)
 
-        self.widget = Gtk.FileChooserDialog(title=title, action=action,
+        self.widget = Gtk.FileChooserDialog(title=self.title, action=action,
                                             buttons=buttons)
-        self.selectedfilter = selectedfilter
 
-        if selectedfilter is not None:
-            self._add_filter(selectedfilter)
+        if self._filter_pattern is not None:
+            self._add_filter(self._filter_pattern)
 
     def _add_filter(self, selectedfilter):
         filtr = Gtk.FileFilter()
         filtr.add_pattern(selectedfilter)
-        if 'png' in selectedfilter:
-            filtr.set_name('Image (*.png)')
-            self.selectedfilter = '.png'
-        elif 'avi' in selectedfilter:
-            filtr.set_name('Movie (*.avi)')
-            self.selectedfilter = '.avi'
-        elif 'npz' in selectedfilter:
-            filtr.set_name('Numpy Compressed Archive (*.npz)')
-            self.selectedfilter = '.npz'
+        if self._filter_name is not None:
+            filtr.set_name(self._filter_name)
         self.widget.add_filter(filtr)
 
     def get_path(self):
+        if self.widget is None:
+            self._make_dialog()
+
         response = self.widget.run()
 
         if response == Gtk.ResponseType.OK:
@@ -2525,9 +2768,11 @@ class SaveDialog(object):
                     not path.endswith(self.selectedfilter)):
                 path += self.selectedfilter
             self.widget.destroy()
+            self.widget = None
             return path
         elif response == Gtk.ResponseType.CANCEL:
             self.widget.destroy()
+            self.widget = None
             return None
 
 
@@ -2561,65 +2806,68 @@ class WidgetMoveEvent(object):
 
 # MODULE FUNCTIONS
 
+# maps every ASCII character that is not valid in a name to '_'
+_mangle_tbl = str.maketrans({chr(i): '_' for i in range(128)
+                             if not (chr(i).isalnum() or chr(i) == '_')})
+
+
+@functools.lru_cache(maxsize=1024)
 def name_mangle(name, pfx=''):
-    newname = []
-    for c in name.lower():
-        if not (c.isalpha() or c.isdigit() or (c == '_')):
-            newname.append('_')
-        else:
-            newname.append(c)
-    return pfx + ''.join(newname)
+    name = name.lower()
+    if name.isascii():
+        newname = name.translate(_mangle_tbl)
+    else:
+        newname = ''.join([c if (c.isalpha() or c.isdigit() or (c == '_'))
+                           else '_' for c in name])
+    # names are used as widget Bunch keys and attribute names, so intern
+    # them for faster lookups
+    return sys.intern(pfx + newname)
+
+
+def _make_label(title, xalign, yalign):
+    w = Label(title)
+    w.label.set_alignment(xalign, yalign)
+    return w
+
+
+# widget factories for make_widget(), keyed by widget type
+_wtype_factories = {
+    'label': lambda title: _make_label(title, 0.95, 0.5),
+    'llabel': lambda title: _make_label(title, 0.05, 0.95),
+    'textentry': lambda title: TextEntry(),
+    'entry': lambda title: TextEntry(),
+    'textentryset': lambda title: TextEntrySet(),
+    'entryset': lambda title: TextEntrySet(),
+    'combobox': lambda title: ComboBox(),
+    'spinbox': lambda title: SpinBox(dtype=int),
+    'spinbutton': lambda title: SpinBox(dtype=int),
+    'spinfloat': lambda title: SpinBox(dtype=float),
+    'vbox': lambda title: VBox(),
+    'hbox': lambda title: HBox(),
+    'hslider': lambda title: Slider(orientation='horizontal'),
+    'hscale': lambda title: Slider(orientation='horizontal'),
+    'vslider': lambda title: Slider(orientation='vertical'),
+    'vscale': lambda title: Slider(orientation='vertical'),
+    'checkbox': lambda title: CheckBox(title),
+    'checkbutton': lambda title: CheckBox(title),
+    'radiobutton': lambda title: RadioButton(title),
+    'togglebutton': lambda title: ToggleButton(title),
+    'button': lambda title: Button(title),
+    'spacer': lambda title: Label(''),
+    'textarea': lambda title: TextArea(editable=True),
+    'toolbar': lambda title: Toolbar(),
+    'progress': lambda title: ProgressBar(),
+    'menubar': lambda title: Menubar(),
+    'dial': lambda title: Dial(),
+}
 
 
 def make_widget(title, wtype):
-    if wtype == 'label':
-        w = Label(title)
-        w.label.set_alignment(0.95, 0.5)
-    elif wtype == 'llabel':
-        w = Label(title)
-        w.label.set_alignment(0.05, 0.95)
-    elif wtype in ('textentry', 'entry'):
-        w = TextEntry()
-        # w.get_widget().set_width_chars(12)
-    elif wtype in ('textentryset', 'entryset'):
-        w = TextEntrySet()
-    elif wtype == 'combobox':
-        w = ComboBox()
-    elif wtype in ('spinbox', 'spinbutton'):
-        w = SpinBox(dtype=int)
-    elif wtype == 'spinfloat':
-        w = SpinBox(dtype=float)
-    elif wtype == 'vbox':
-        w = VBox()
-    elif wtype == 'hbox':
-        w = HBox()
-    elif wtype in ('hslider', 'hscale'):
-        w = Slider(orientation='horizontal')
-    elif wtype in ('vslider', 'vscale'):
-        w = Slider(orientation='vertical')
-    elif wtype in ('checkbox', 'checkbutton'):
-        w = CheckBox(title)
-    elif wtype == 'radiobutton':
-        w = RadioButton(title)
-    elif wtype == 'togglebutton':
-        w = ToggleButton(title)
-    elif wtype == 'button':
-        w = Button(title)
-    elif wtype == 'spacer':
-        w = Label('')
-    elif wtype == 'textarea':
-        w = TextArea(editable=True)
-    elif wtype == 'toolbar':
-        w = Toolbar()
-    elif wtype == 'progress':
-        w = ProgressBar()
-    elif wtype == 'menubar':
-        w = Menubar()
-    elif wtype == 'dial':
-        w = Dial()
-    else:
+    try:
+        factory = _wtype_factories[wtype]
+    except KeyError:
         raise ValueError("Bad wtype=%s" % wtype)
-    return w
+    return factory(title)
 
 
 def hadjust(w, orientation):
@@ -2642,48 +2890,58 @@ def hadjust(w, orientation):
 def build_info(captions, orientation='vertical'):
     vbox = Gtk.VBox(spacing=2)
 
-    numrows = len(captions)
-    numcols = reduce(lambda acc, tup: max(acc, len(tup)), captions, 0)
-    if (numcols % 2) != 0:
+    numcols = max(map(len, captions), default=0)
+    if numcols & 1:
         raise ValueError("Column spec is not an even number")
-    numcols = int(numcols // 2)
-    table = Gtk.Table(rows=numrows, columns=numcols)
-    table.set_row_spacings(2)
-    table.set_col_spacings(4)
-    vbox.pack_start(table, False, False, 0)
+    # NOTE: spacings include the 1 pixel padding on each side of a cell
+    # that the old Gtk.Table layout used
+    grid = Gtk.Grid()
+    grid.set_row_spacing(4)
+    grid.set_column_spacing(6)
+    grid.set_border_width(1)
 
     wb = Bunch.Bunch()
-    row = 0
-    for tup in captions:
-        col = 0
-        while col < numcols:
-            idx = col * 2
-            if idx < len(tup):
-                title, wtype = tup[idx:idx + 2]
-                if not title.endswith(':'):
-                    name = name_mangle(title)
-                else:
-                    name = name_mangle('lbl_' + title[:-1])
-                w = make_widget(title, wtype)
-                table.attach(w.get_widget(), col, col + 1, row, row + 1,
-                             xoptions=Gtk.AttachOptions.FILL,
-                             yoptions=Gtk.AttachOptions.FILL,
-                             xpadding=1, ypadding=1)
-                wb[name] = w
-            col += 1
-        row += 1
-
-    vbox.show_all()
+    attach, mangle = grid.attach, name_mangle
+    for row, tup in enumerate(captions):
+        for col, (title, wtype) in enumerate(zip(tup[0::2], tup[1::2])):
+            if not title.endswith(':'):
+                name = mangle(title)
+            else:
+                name = mangle('lbl_' + title[:-1])
+            w = make_widget(title, wtype)
+            attach(w.widget, col, row, 1, 1)
+            wb[name] = w
+
+    # the grid is filled before it is packed, so that attaching does not
+    # queue a resize on the parent for every widget
+    vbox.pack_start(grid, False, False, 0)
 
+    # NOTE: the widgets are not shown here; the container that the
+    # result is added to shows it (and all its children) once
     w = wrap(vbox)
     w = hadjust(w, orientation=orientation)
 
     return w, wb
 
 
+# wrappers made by wrap(), keyed by id of the native widget
+_wrap_cache = weakref.WeakValueDictionary()
+
+
 def wrap(native_widget):
-    wrapper = WidgetBase()
-    wrapper.widget = native_widget
+    """Wrap a native Gtk widget in a WidgetBase.
+
+    NOTE: while a wrapper for `native_widget` is alive, the same (shared)
+    wrapper object is returned, including its callbacks and extdata.
+    """
+    key = id(native_widget)
+    wrapper = _wrap_cache.get(key, None)
+    # the wrapper may have let go of its widget (see delete()), in which
+    # case the id may since have been reused by an unrelated object
+    if wrapper is None or wrapper.widget is not native_widget:
+        wrapper = WidgetBase()
+        wrapper.widget = native_widget
+        _wrap_cache[key] = wrapper
     return wrapper
 
 
@@ -17,18 +17,10 @@ elif tkname == 'pg':
 # MODULE FUNCTIONS
 
 def get_orientation(container, aspect=1.0):
-    if not hasattr(container, 'size'):
-        return 'vertical'
-    (wd, ht) = container.size
-    # wd, ht = container.get_size()
-    # print('container size is %dx%d' % (wd, ht))
-    if ht == 0:
-        return 'horizontal' if wd > 0 else 'vertical'
-    calc_aspect = wd / ht
-    if calc_aspect <= aspect:
-        return 'vertical'
-    else:
-        return 'horizontal'
+    # a container with no size is treated as having zero width
+    (wd, ht) = getattr(container, 'size', (0, 0))
+    # NOTE: same as comparing wd / ht to aspect, but also covers ht == 0
+    return 'vertical' if wd <= aspect * ht else 'horizontal'
 
 
 def get_oriented_box(container, scrolled=True, fill=False,
@@ -36,12 +28,8 @@ def get_oriented_box(container, scrolled=True, fill=False,
     if orientation is None:
         orientation = get_orientation(container, aspect=aspect)
 
-    if orientation == 'vertical':
-        box1 = VBox()  # noqa
-        box2 = VBox()  # noqa
-    else:
-        box1 = HBox()  # noqa
-        box2 = VBox()  # noqa
+    box1 = (HBox, VBox)[orientation == 'vertical']()  # noqa
+    box2 = VBox()  # noqa
 
     box2.add_widget(box1, stretch=0)
     if not fill:
@@ -56,10 +44,6 @@ def get_oriented_box(container, scrolled=True, fill=False,
 
 
 def get_opposed_box(orientation):
-    if orientation == 'vertical':
-        box = HBox()  # noqa
-    else:
-        box = VBox()  # noqa
-    return box
+    return (VBox, HBox)[orientation == 'vertical']()  # noqa
 
 # END